@@ -3,56 +3,71 @@ Health Check Script for Analytics Service Container
 Performs health checks on the Python analytics service
 """
 
-import asyncio
+import http.client
+import socket
 import sys
 import os
-import aiohttp
 from datetime import datetime
 
 # Configuration
 HOST = os.getenv('HOST', 'localhost')
 PORT = int(os.getenv('PORT', 8000))
 TIMEOUT = int(os.getenv('HEALTH_CHECK_TIMEOUT', 5))
+VERBOSE = os.getenv('HEALTH_CHECK_VERBOSE', 'false').lower() in ('1', 'true', 'yes')
 
-async def perform_health_check():
+def perform_health_check():
     """
-    Performs async HTTP health check on the analytics service
+    Performs a blocking HTTP health check on the analytics service
     """
-    url = f"http://{HOST}:{PORT}/health"
+    conn = http.client.HTTPConnection(HOST, PORT, timeout=TIMEOUT)
     
     try:
-        timeout = aiohttp.ClientTimeout(total=TIMEOUT)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    if data.get('status') == 'healthy':
-                        print(f"Health check passed: {data}")
-                        return True
-                    else:
-                        print(f"Health check failed: Service unhealthy - {data}")
-                        return False
+        conn.request("GET", "/health")
+        response = conn.getresponse()
+        
+        if response.status == 200:
+            if VERBOSE:
+                import orjson  # only the verbose path decodes JSON
+                
+                data = orjson.loads(response.read())
+                
+                if data.get('status') == 'healthy':
+                    print(f"Health check passed: {data}")
+                    return True
                 else:
-                    print(f"Health check failed: HTTP {response.status}")
+                    print(f"Health check failed: Service unhealthy - {data}")
                     return False
-                    
-    except asyncio.TimeoutError:
+            
+            # Status is the first field of the response, so a prefix is enough
+            buf = response.read(256)
+            if b'"status":"healthy"' in buf or b'"healthy"' in buf:
+                print("Health check passed")
+                return True
+            else:
+                print(f"Health check failed: Service unhealthy - {buf!r}")
+                return False
+        else:
+            print(f"Health check failed: HTTP {response.status}")
+            return False
+                
+    except socket.timeout:
         print(f"Health check failed: Timeout after {TIMEOUT}s")
         return False
-    except aiohttp.ClientError as e:
+    except (http.client.HTTPException, OSError) as e:
         print(f"Health check failed: Client error - {e}")
         return False
     except Exception as e:
         print(f"Health check failed: Unexpected error - {e}")
         return False
+    finally:
+        conn.close()
 
-async def main():
+def main():
     """Main health check execution"""
     print(f"Performing health check on analytics service at {HOST}:{PORT}")
     print(f"Timestamp: {datetime.utcnow().isoformat()}")
     
-    success = await perform_health_check()
+    success = perform_health_check()
     
     if success:
         print("Analytics service health check: PASSED")
@@ -62,4 +77,4 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
\ No newline at end of file
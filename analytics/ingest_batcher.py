@@ -0,0 +1,117 @@
+"""
+Incident Ingestion Batcher
+Coalesces concurrent incident ingest requests into bulk writes
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+
+class IncidentBatcher:
+    """
+    Queues incidents and flushes them to the analytics service in batches.
+
+    A batch is written with a single ingest_incidents_bulk call once it
+    reaches max_batch_size items or once the oldest queued item has waited
+    max_queue_time seconds.
+    """
+
+    def __init__(
+        self,
+        service,
+        max_batch_size: int = 64,
+        max_queue_time: float = 0.05
+    ):
+        self.service = service
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def start(self):
+        """Start the background flush loop"""
+        if self._task is None:
+            self._closed = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush pending incidents and stop the background loop"""
+        if self._task is None:
+            return
+        self._closed = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def process(self, incident: Dict[str, Any]) -> Any:
+        """Queue an incident and wait for the result of its batch"""
+        if self._task is None or self._closed:
+            raise RuntimeError("Incident batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((incident, future))
+        return await future
+
+    async def process_batch(
+        self,
+        batch: List[Tuple[Dict[str, Any], asyncio.Future]]
+    ):
+        """Write a batch and resolve each caller; never raises"""
+        incidents = [incident for incident, _ in batch]
+        try:
+            results = await self.service.ingest_incidents_bulk(incidents)
+            if results is None or len(results) != len(batch):
+                raise ValueError(
+                    f"Bulk ingestion returned {results!r} "
+                    f"for a batch of {len(batch)} incidents"
+                )
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            logger.error(
+                "bulk_incident_ingestion_failed",
+                error=str(e),
+                exc_info=True
+            )
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.max_queue_time
+            stopping = False
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(
+                        self._queue.get(), remaining
+                    )
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self.process_batch(batch)
+            if stopping:
+                return
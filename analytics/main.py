@@ -4,34 +4,97 @@ Enterprise-grade data processing and machine learning service for safety analyti
 """
 
 import os
+import json
 import logging
 import asyncio
-from typing import Dict, List, Optional
+import atexit
+import fcntl
+import hashlib
+import heapq
+import shutil
+import sys
+import tempfile
+import time
+from functools import wraps
+from typing import TYPE_CHECKING, Dict, List, Optional
 from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GzipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel, Field
+import orjson
 import redis.asyncio as redis
 import structlog
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
-from prometheus_client import start_http_server
+from prometheus_client import start_http_server, CollectorRegistry, REGISTRY, multiprocess
 
 from config import settings
 from database import Database
-from models.safety_models import SafetyPredictionModel, IncidentAnalysisModel
-from services.analytics_service import AnalyticsService
-from services.prediction_service import PredictionService
-from services.report_service import ReportService
 from utils.logger import setup_logging
 from utils.metrics import MetricsCollector
+from utils.middleware import SlowRequestLoggingMiddleware, TimeoutMiddleware
+from utils.singleflight import singleflight
+
+# Services pull in the ML stack; they are imported in lifespan so app discovery stays cheap
+if TYPE_CHECKING:
+    from services.analytics_service import AnalyticsService
+    from services.prediction_service import PredictionService
+    from services.report_service import ReportService
 
 # Setup logging
 setup_logging()
+
+def _orjson_renderer(renderer):
+    """orjson equivalent of a stdlib-json JSONRenderer, or None if its options have no orjson counterpart"""
+    dumps_kw = dict(getattr(renderer, "_dumps_kw", None) or {})
+    if getattr(renderer, "_dumps", None) is not json.dumps:
+        return None
+    
+    option = 0
+    if dumps_kw.pop("sort_keys", False):
+        option |= orjson.OPT_SORT_KEYS
+    if dumps_kw.get("indent") == 2:
+        dumps_kw.pop("indent")
+        option |= orjson.OPT_INDENT_2
+    default = dumps_kw.pop("default", None)
+    if dumps_kw:
+        return None
+    
+    return structlog.processors.JSONRenderer(serializer=orjson.dumps, default=default, option=option)
+
+def _bytes_logger_factory(factory):
+    """BytesLoggerFactory writing to the same stream as a PrintLoggerFactory, or None"""
+    # Only PrintLogger has a bytes twin; stdlib-backed factories need logger.name/isEnabledFor and handlers
+    if type(factory) is not structlog.PrintLoggerFactory:
+        return None
+    stream = getattr(factory, "_file", None) or sys.stdout
+    buffer = getattr(stream, "buffer", None)
+    return structlog.BytesLoggerFactory(buffer) if buffer is not None else None
+
+def _tune_logging():
+    """Render JSON logs with orjson straight to bytes and filter levels before processors run"""
+    config = {"cache_logger_on_first_use": True}
+    
+    current = structlog.get_config()
+    processors = current["processors"]
+    if processors and isinstance(processors[-1], structlog.processors.JSONRenderer):
+        renderer = _orjson_renderer(processors[-1])
+        logger_factory = _bytes_logger_factory(current["logger_factory"])
+        if renderer is not None and logger_factory is not None:
+            config["processors"] = [*processors[:-1], renderer]
+            config["logger_factory"] = logger_factory
+    
+    if not settings.debug:
+        # Drop debug/info calls at the bound-logger level before any processor runs
+        config["wrapper_class"] = structlog.make_filtering_bound_logger(logging.WARNING)
+    
+    structlog.configure(**config)
+
+_tune_logging()
 logger = structlog.get_logger()
 
 # Metrics
@@ -40,18 +103,70 @@ REQUEST_DURATION = Histogram('analytics_request_duration_seconds', 'Request dura
 PREDICTION_COUNT = Counter('safety_predictions_total', 'Total safety predictions', ['type'])
 MODEL_ACCURACY = Histogram('model_accuracy_score', 'Model accuracy scores', ['model_type'])
 
+def metrics_registry():
+    """Registry to expose; aggregates all workers when running in multiprocess mode"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def timed(histogram):
+    """Observe an async handler's duration with perf_counter, without a context manager per call"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - t0)
+        return wrapper
+    return decorator
+
+# Pre-bound labelled children, resolved once at import time
+REQ_INCIDENTS = REQUEST_COUNT.labels(method="POST", endpoint="/analytics/incidents")
+REQ_PREDICTIONS = REQUEST_COUNT.labels(method="POST", endpoint="/analytics/predictions")
+REQ_EXECUTIVE_REPORT = REQUEST_COUNT.labels(method="POST", endpoint="/analytics/reports/executive")
+REQ_INGEST = REQUEST_COUNT.labels(method="POST", endpoint="/analytics/incidents/ingest")
+PRED_CHILDREN = {
+    t: PREDICTION_COUNT.labels(type=t)
+    for t in ("incident_risk", "cost_forecast", "safety_score")
+}
+
 # Global services
 db: Optional[Database] = None
 redis_client: Optional[redis.Redis] = None
-analytics_service: Optional[AnalyticsService] = None
-prediction_service: Optional[PredictionService] = None
-report_service: Optional[ReportService] = None
+analytics_service: Optional["AnalyticsService"] = None
+prediction_service: Optional["PredictionService"] = None
+report_service: Optional["ReportService"] = None
+
+# Health check cache: (monotonic timestamp, response), refreshed at most once per TTL
+_HEALTH_TTL = float(os.getenv("HEALTH_CACHE_TTL", "3"))
+_health_cache: Optional[tuple] = None
+_health_lock = asyncio.Lock()
+
+# Response timestamps are formatted at most once per wall-clock second
+_TS_CACHE = [0, ""]
+
+def _now_iso() -> str:
+    """Current UTC time as an ISO-8601 string, truncated to the second"""
+    s = int(time.time())
+    if s != _TS_CACHE[0]:
+        _TS_CACHE[0] = s
+        _TS_CACHE[1] = datetime.utcfromtimestamp(s).isoformat() + "Z"
+    return _TS_CACHE[1]
+
+def _request_key(namespace: str, request: BaseModel) -> str:
+    """Stable hash of a request body, scoped to the calling endpoint"""
+    payload = orjson.dumps([namespace, request.model_dump()], option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
 
 # Pydantic models
 class SafetyIncident(BaseModel):
     incident_id: str
     timestamp: datetime
-    severity: str = Field(..., regex="^(low|medium|high|critical)$")
+    severity: str = Field(..., pattern="^(low|medium|high|critical)$")
     category: str
     description: str
     location: str
@@ -66,7 +181,7 @@ class AnalyticsRequest(BaseModel):
     filters: Optional[Dict] = {}
 
 class PredictionRequest(BaseModel):
-    prediction_type: str = Field(..., regex="^(incident_risk|cost_forecast|safety_score)$")
+    prediction_type: str = Field(..., pattern="^(incident_risk|cost_forecast|safety_score)$")
     time_horizon: int = Field(default=30, ge=1, le=365)
     parameters: Optional[Dict] = {}
 
@@ -90,22 +205,36 @@ async def lifespan(app: FastAPI):
     logger.info("Database connected")
     
     # Initialize Redis connection
-    redis_client = redis.from_url(settings.redis_url)
+    redis_client = redis.from_url(
+        settings.redis_url,
+        max_connections=64,
+        health_check_interval=30,
+        socket_keepalive=True,
+        decode_responses=False
+    )
     await redis_client.ping()
     logger.info("Redis connected")
     
     # Initialize services
+    from services.analytics_service import AnalyticsService
+    from services.prediction_service import PredictionService
+    from services.report_service import ReportService
+    
     analytics_service = AnalyticsService(db, redis_client)
     prediction_service = PredictionService(db, redis_client)
     report_service = ReportService(db, redis_client)
     
-    # Start background tasks
-    asyncio.create_task(background_model_training())
-    asyncio.create_task(background_metrics_collection())
+    # Start background scheduler in one worker only (the first to take the lock).
+    # Models retrained there are not reloaded by the other workers; see docs/DEPLOYMENT.md
+    scheduler_lock = _acquire_scheduler_lock()
+    scheduler_task = asyncio.create_task(_scheduler()) if scheduler_lock else None
     
-    # Start Prometheus metrics server
-    start_http_server(8001)
-    logger.info("Prometheus metrics server started on port 8001")
+    # Start Prometheus metrics server (only the first worker can bind the port)
+    try:
+        start_http_server(8001, registry=metrics_registry())
+        logger.info("Prometheus metrics server started on port 8001")
+    except OSError:
+        logger.info("Prometheus metrics server already running on port 8001")
     
     logger.info("Analytics service initialization completed")
     
@@ -113,8 +242,14 @@ async def lifespan(app: FastAPI):
     
     # Cleanup
     logger.info("Shutting down analytics service")
+    if scheduler_task:
+        scheduler_task.cancel()
+        await asyncio.gather(scheduler_task, return_exceptions=True)
+        scheduler_lock.close()
     await redis_client.close()
     await db.disconnect()
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
     logger.info("Analytics service shutdown completed")
 
 # Initialize FastAPI app
@@ -124,10 +259,14 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs" if settings.debug else None,
     redoc_url="/redoc" if settings.debug else None,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
 # Middleware
+# The timeout is added first so it sits innermost and its 504 still passes through CORS and request logging
+app.add_middleware(TimeoutMiddleware, timeout=float(os.getenv("REQUEST_TIMEOUT", "30")))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
@@ -136,66 +275,132 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(GzipMiddleware, minimum_size=1000)
+app.add_middleware(GZipMiddleware, minimum_size=16_384)
+
+app.add_middleware(
+    SlowRequestLoggingMiddleware,
+    threshold=float(os.getenv("SLOW_REQUEST_THRESHOLD", "1.0"))
+)
 
 # Dependency injection
-async def get_analytics_service() -> AnalyticsService:
+async def get_analytics_service() -> "AnalyticsService":
     if analytics_service is None:
         raise HTTPException(status_code=503, detail="Analytics service not available")
     return analytics_service
 
-async def get_prediction_service() -> PredictionService:
+async def get_prediction_service() -> "PredictionService":
     if prediction_service is None:
         raise HTTPException(status_code=503, detail="Prediction service not available")
     return prediction_service
 
-async def get_report_service() -> ReportService:
+async def get_report_service() -> "ReportService":
     if report_service is None:
         raise HTTPException(status_code=503, detail="Report service not available")
     return report_service
 
 # Background tasks
 async def background_model_training():
-    """Background task for periodic model training"""
-    while True:
-        try:
-            logger.info("Starting scheduled model training")
-            if prediction_service:
-                await prediction_service.retrain_models()
-            logger.info("Scheduled model training completed")
-        except Exception as e:
-            logger.error(f"Model training failed: {e}")
-        
-        # Wait for next training cycle (24 hours)
-        await asyncio.sleep(86400)
+    """Periodic model training job"""
+    try:
+        logger.info("Starting scheduled model training")
+        if prediction_service:
+            await prediction_service.retrain_models()
+        logger.info("Scheduled model training completed")
+    except Exception as e:
+        logger.error("model_training_failed", error=str(e), exc_info=True)
 
 async def background_metrics_collection():
-    """Background task for metrics collection"""
-    while True:
-        try:
-            if analytics_service:
-                await analytics_service.collect_system_metrics()
-        except Exception as e:
-            logger.error(f"Metrics collection failed: {e}")
-        
-        # Collect metrics every 5 minutes
-        await asyncio.sleep(300)
+    """Periodic metrics collection job"""
+    try:
+        if analytics_service:
+            await analytics_service.collect_system_metrics()
+    except Exception as e:
+        logger.error("metrics_collection_failed", error=str(e), exc_info=True)
+
+# (interval seconds, job) pairs run by the background scheduler
+BACKGROUND_JOBS = [
+    (300, background_metrics_collection),   # every 5 minutes
+    (86400, background_model_training),     # every 24 hours
+]
+
+def _acquire_scheduler_lock():
+    """Take the host-wide scheduler lock; returns the open lock file, or None if another worker holds it"""
+    path = os.getenv("SCHEDULER_LOCK_FILE", os.path.join(tempfile.gettempdir(), "analytics-scheduler.lock"))
+    lock_file = open(path, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        logger.info("Background scheduler already running in another worker")
+        return None
+    return lock_file
+
+async def _scheduler():
+    """Run all background jobs from a single task, earliest deadline first"""
+    loop = asyncio.get_running_loop()
+    now = loop.time()
+    
+    # The index breaks deadline ties so job callables are never compared
+    jobs = [(now, index, interval, job) for index, (interval, job) in enumerate(BACKGROUND_JOBS)]
+    heapq.heapify(jobs)
+    
+    # Jobs run as their own tasks so a long training run never delays metrics collection
+    running: Dict[int, asyncio.Task] = {}
+    try:
+        while True:
+            next_ts, index, interval, job = heapq.heappop(jobs)
+            await asyncio.sleep(max(0, next_ts - loop.time()))
+            
+            # A job never overlaps with its own previous run
+            task = running.get(index)
+            if task is None or task.done():
+                running[index] = asyncio.create_task(job())
+            
+            # Skip missed ticks rather than running a job back-to-back
+            heapq.heappush(jobs, (max(next_ts + interval, loop.time()), index, interval, job))
+    finally:
+        for task in running.values():
+            task.cancel()
+        await asyncio.gather(*running.values(), return_exceptions=True)
 
 # Health endpoints
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint for container monitoring"""
-    try:
-        # Check database
-        db_status = "connected" if db and await db.health_check() else "disconnected"
+    global _health_cache
+    
+    if _health_cache and time.monotonic() - _health_cache[0] < _HEALTH_TTL:
+        return _health_cache[1]
+    
+    # Single-flight: only one coroutine probes the backends on a cache miss
+    async with _health_lock:
+        now = time.monotonic()
+        if _health_cache and now - _health_cache[0] < _HEALTH_TTL:
+            return _health_cache[1]
         
-        # Check Redis
-        redis_status = "connected"
-        try:
-            if redis_client:
-                await redis_client.ping()
-        except:
-            redis_status = "disconnected"
+        response = await _probe_health()
+        _health_cache = (now, response)
+        return response
+
+async def _safe_check(check) -> bool:
+    """Await a backend check, treating a missing backend or any error as down"""
+    if check is None:
+        return False
+    try:
+        return bool(await check)
+    except Exception:
+        return False
+
+async def _probe_health() -> HealthResponse:
+    """Check backend connectivity and build the health response"""
+    try:
+        # Check database and Redis concurrently
+        db_ok, redis_ok = await asyncio.gather(
+            _safe_check(db.health_check() if db else None),
+            _safe_check(redis_client.ping() if redis_client else None)
+        )
+        db_status = "connected" if db_ok else "disconnected"
+        redis_status = "connected" if redis_ok else "disconnected"
         
         return HealthResponse(
             status="healthy" if db_status == "connected" and redis_status == "connected" else "unhealthy",
@@ -211,7 +416,7 @@ async def health_check():
             }
         )
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("health_check_failed", error=str(e), exc_info=True)
         return HealthResponse(
             status="unhealthy",
             timestamp=datetime.utcnow(),
@@ -223,71 +428,80 @@ async def health_check():
 @app.get("/metrics")
 async def metrics():
     """Prometheus metrics endpoint"""
-    return generate_latest()
+    return Response(
+        content=generate_latest(metrics_registry()),
+        headers={"Content-Type": CONTENT_TYPE_LATEST}
+    )
 
 # Analytics endpoints
 @app.post("/api/v1/analytics/incidents")
+@timed(REQUEST_DURATION)
 async def analyze_incidents(
     request: AnalyticsRequest,
-    service: AnalyticsService = Depends(get_analytics_service)
+    service: "AnalyticsService" = Depends(get_analytics_service)
 ):
     """Analyze safety incidents for executive reporting"""
-    REQUEST_COUNT.labels(method="POST", endpoint="/analytics/incidents").inc()
+    REQ_INCIDENTS.inc()
     
-    with REQUEST_DURATION.time():
-        try:
-            result = await service.analyze_incidents(
+    try:
+        result = await singleflight(
+            _request_key("analyze_incidents", request),
+            lambda: service.analyze_incidents(
                 start_date=request.start_date,
                 end_date=request.end_date,
                 metrics=request.metrics,
                 filters=request.filters
             )
-            
-            return JSONResponse(content={
-                "status": "success",
-                "data": result,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-        except Exception as e:
-            logger.error(f"Incident analysis failed: {e}")
-            raise HTTPException(status_code=500, detail=str(e))
+        )
+        
+        return ORJSONResponse(content={
+            "status": "success",
+            "data": result,
+            "timestamp": _now_iso()
+        })
+        
+    except Exception as e:
+        logger.error("incident_analysis_failed", error=str(e), exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/v1/analytics/predictions")
+@timed(REQUEST_DURATION)
 async def generate_predictions(
     request: PredictionRequest,
-    service: PredictionService = Depends(get_prediction_service)
+    service: "PredictionService" = Depends(get_prediction_service)
 ):
     """Generate safety predictions using machine learning models"""
-    REQUEST_COUNT.labels(method="POST", endpoint="/analytics/predictions").inc()
-    PREDICTION_COUNT.labels(type=request.prediction_type).inc()
+    REQ_PREDICTIONS.inc()
+    PRED_CHILDREN[request.prediction_type].inc()
     
-    with REQUEST_DURATION.time():
-        try:
-            result = await service.generate_prediction(
+    try:
+        result = await singleflight(
+            _request_key("generate_prediction", request),
+            lambda: service.generate_prediction(
                 prediction_type=request.prediction_type,
                 time_horizon=request.time_horizon,
                 parameters=request.parameters
             )
-            
-            return JSONResponse(content={
-                "status": "success",
-                "data": result,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-        except Exception as e:
-            logger.error(f"Prediction generation failed: {e}")
-            raise HTTPException(status_code=500, detail=str(e))
+        )
+        
+        return ORJSONResponse(content={
+            "status": "success",
+            "data": result,
+            "timestamp": _now_iso()
+        })
+        
+    except Exception as e:
+        logger.error("prediction_generation_failed", error=str(e), exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/v1/analytics/reports/executive")
 async def generate_executive_report(
     request: AnalyticsRequest,
     background_tasks: BackgroundTasks,
-    service: ReportService = Depends(get_report_service)
+    service: "ReportService" = Depends(get_report_service)
 ):
     """Generate comprehensive executive safety report"""
-    REQUEST_COUNT.labels(method="POST", endpoint="/analytics/reports/executive").inc()
+    REQ_EXECUTIVE_REPORT.inc()
     
     try:
         # Start report generation in background
@@ -297,75 +511,87 @@ async def generate_executive_report(
             filters=request.filters
         )
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "status": "accepted",
             "task_id": task_id,
             "message": "Executive report generation started",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _now_iso()
         })
         
     except Exception as e:
-        logger.error(f"Executive report generation failed: {e}")
+        logger.error("executive_report_generation_failed", error=str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/analytics/reports/{task_id}/status")
 async def get_report_status(
     task_id: str,
-    service: ReportService = Depends(get_report_service)
+    service: "ReportService" = Depends(get_report_service)
 ):
     """Get status of report generation task"""
     try:
         status = await service.get_report_status(task_id)
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "status": "success",
             "data": status,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _now_iso()
         })
         
     except Exception as e:
-        logger.error(f"Report status check failed: {e}")
+        logger.error("report_status_check_failed", error=str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/v1/analytics/incidents/ingest")
 async def ingest_incident(
     incident: SafetyIncident,
-    service: AnalyticsService = Depends(get_analytics_service)
+    service: "AnalyticsService" = Depends(get_analytics_service)
 ):
     """Ingest new safety incident data"""
-    REQUEST_COUNT.labels(method="POST", endpoint="/analytics/incidents/ingest").inc()
+    REQ_INGEST.inc()
     
     try:
-        result = await service.ingest_incident(incident.dict())
+        result = await service.ingest_incident(incident.model_dump())
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "status": "success",
             "data": result,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _now_iso()
         })
         
     except Exception as e:
-        logger.error(f"Incident ingestion failed: {e}")
+        logger.error("incident_ingestion_failed", error=str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Error handlers
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
-    logger.error(f"Unhandled exception: {exc}")
-    return JSONResponse(
+    logger.error("unhandled_exception", error=str(exc), exc_info=exc)
+    return ORJSONResponse(
         status_code=500,
         content={
             "status": "error",
             "message": "Internal server error",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _now_iso()
         }
     )
 
 if __name__ == "__main__":
+    # Sized explicitly: cpu_count() ignores container CPU quotas and every worker loads the ML stack
+    workers = 1 if settings.debug else int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        # Workers share metric values through this directory, removed when the server exits
+        metrics_dir = tempfile.mkdtemp(prefix="prometheus-")
+        atexit.register(shutil.rmtree, metrics_dir, ignore_errors=True)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
         log_level="info",
-        access_log=True,
+        access_log=False,
+        timeout_keep_alive=5,
         reload=settings.debug
     )
\ No newline at end of file
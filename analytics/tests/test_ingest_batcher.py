@@ -0,0 +1,104 @@
+"""
+Tests for the incident ingestion batcher
+"""
+
+import asyncio
+
+import pytest
+
+from ingest_batcher import IncidentBatcher
+
+
+class BulkService:
+    """Stub analytics service recording each bulk write"""
+
+    def __init__(self, results=None):
+        self.calls = []
+        self.results = results
+
+    async def ingest_incidents_bulk(self, incidents):
+        self.calls.append(incidents)
+        if self.results is not None:
+            return self.results(incidents)
+        return [incident["n"] * 2 for incident in incidents]
+
+
+async def run_batch(service, count, max_batch_size=4):
+    batcher = IncidentBatcher(service, max_batch_size=max_batch_size)
+    batcher.start()
+    try:
+        return await asyncio.wait_for(
+            asyncio.gather(
+                *(batcher.process({"n": n}) for n in range(count)),
+                return_exceptions=True
+            ),
+            timeout=1
+        )
+    finally:
+        await batcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_incidents_are_written_in_batches():
+    service = BulkService()
+
+    results = await run_batch(service, 10)
+
+    assert results == [n * 2 for n in range(10)]
+    assert [len(call) for call in service.calls] == [4, 4, 2]
+
+
+@pytest.mark.asyncio
+async def test_malformed_bulk_result_fails_every_caller():
+    service = BulkService(results=lambda incidents: len(incidents))
+
+    results = await run_batch(service, 3)
+
+    assert all(isinstance(result, TypeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_short_bulk_result_fails_every_caller():
+    service = BulkService(results=lambda incidents: incidents[:1])
+
+    results = await run_batch(service, 3)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_per_item_exceptions_reach_their_callers():
+    def results(incidents):
+        return [
+            asyncio.CancelledError() if incident["n"] == 1 else incident["n"]
+            for incident in incidents
+        ]
+
+    outcomes = await run_batch(BulkService(results=results), 3)
+
+    assert outcomes[0] == 0
+    assert isinstance(outcomes[1], asyncio.CancelledError)
+    assert outcomes[2] == 2
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_pending_incidents():
+    service = BulkService()
+    batcher = IncidentBatcher(service, max_queue_time=10)
+    batcher.start()
+
+    pending = asyncio.ensure_future(batcher.process({"n": 5}))
+    await asyncio.sleep(0)
+    await batcher.stop()
+
+    assert await pending == 10
+
+
+@pytest.mark.asyncio
+async def test_process_after_stop_raises():
+    batcher = IncidentBatcher(BulkService())
+    batcher.start()
+    await batcher.stop()
+
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(batcher.process({"n": 1}), timeout=0.5)
@@ -0,0 +1,104 @@
+"""
+Tests for request coalescing
+"""
+
+import asyncio
+
+import pytest
+
+from utils import singleflight as sf
+
+
+class Work:
+    """Counts calls and blocks until released"""
+
+    def __init__(self, result=42):
+        self.calls = 0
+        self.cancelled = 0
+        self.result = result
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def clear_inflight():
+    sf._inflight.clear()
+    yield
+    sf._inflight.clear()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_computation():
+    work = Work()
+
+    callers = [
+        asyncio.ensure_future(sf.singleflight("k", work)) for _ in range(5)
+    ]
+    await asyncio.sleep(0)
+    work.release.set()
+
+    assert await asyncio.gather(*callers) == [42] * 5
+    assert work.calls == 1
+    assert sf._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_exception_reaches_every_caller_and_releases_key():
+    work = Work(result=ValueError("boom"))
+
+    callers = [
+        asyncio.ensure_future(sf.singleflight("k", work)) for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    work.release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert sf._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_follower():
+    work = Work()
+
+    leader = asyncio.ensure_future(
+        asyncio.wait_for(sf.singleflight("k", work), 0.05)
+    )
+    follower = asyncio.ensure_future(sf.singleflight("k", work))
+
+    with pytest.raises(asyncio.TimeoutError):
+        await leader
+    work.release.set()
+
+    assert await follower == 42
+    assert work.calls == 1
+    assert work.cancelled == 0
+
+
+@pytest.mark.asyncio
+async def test_last_waiter_leaving_cancels_work_and_releases_key():
+    stuck = Work()
+
+    for _ in range(2):
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(sf.singleflight("k", stuck), 0.05)
+        await asyncio.sleep(0)
+
+    assert stuck.calls == 2
+    assert stuck.cancelled == 2
+    assert sf._inflight == {}
+
+    fresh = Work()
+    fresh.release.set()
+    assert await sf.singleflight("k", fresh) == 42
+    assert fresh.calls == 1
@@ -0,0 +1,101 @@
+"""
+ASGI Middleware
+Lightweight request middleware for the analytics service
+"""
+
+import asyncio
+import time
+
+import structlog
+
+logger = structlog.get_logger()
+
+
+class SlowRequestLoggingMiddleware:
+    """
+    Logs only failed (5xx) or slow requests.
+
+    Replaces the uvicorn access log so successful requests do not pay for
+    log formatting on the hot path.
+    """
+
+    def __init__(self, app, threshold: float = 1.0):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            if status_code >= 500 or duration > self.threshold:
+                logger.warning(
+                    "request_completed",
+                    method=scope["method"],
+                    path=scope["path"],
+                    status=status_code,
+                    duration=round(duration, 4)
+                )
+
+
+class TimeoutMiddleware:
+    """
+    Bounds the total time a request may occupy a worker.
+
+    Requests exceeding the timeout are cancelled and answered with a 504,
+    unless the response has already started streaming.
+    """
+
+    def __init__(self, app, timeout: float = 30.0):
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await asyncio.wait_for(
+                self.app(scope, receive, send_wrapper), self.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "request_timeout",
+                method=scope["method"],
+                path=scope["path"],
+                timeout=self.timeout
+            )
+            if response_started:
+                return
+            body = b'{"status":"error","message":"Request timed out"}'
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
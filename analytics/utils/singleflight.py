@@ -0,0 +1,57 @@
+"""
+Request Coalescing
+Shares one in-flight computation between identical concurrent requests
+"""
+
+import asyncio
+from typing import Dict
+
+
+class _Call:
+    """An in-flight computation and the number of callers awaiting it"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+_inflight: Dict[str, _Call] = {}
+
+
+async def singleflight(key: str, coro_factory):
+    """
+    Run coro_factory once per key; concurrent callers share its result.
+
+    The work runs in its own task, so one caller being cancelled does not
+    affect the others. When the last caller leaves before the work is done
+    (e.g. every request timed out), the work is cancelled and the key is
+    released so later requests start afresh instead of joining it.
+    """
+    call = _inflight.get(key)
+    if call is None:
+        call = _Call(asyncio.create_task(coro_factory()))
+        _inflight[key] = call
+        call.task.add_done_callback(lambda task: _finish(key, call))
+
+    call.waiters += 1
+    try:
+        return await asyncio.shield(call.task)
+    finally:
+        call.waiters -= 1
+        if call.waiters == 0 and not call.task.done():
+            call.task.cancel()
+            _forget(key, call)
+
+
+def _forget(key: str, call: _Call):
+    if _inflight.get(key) is call:
+        del _inflight[key]
+
+
+def _finish(key: str, call: _Call):
+    _forget(key, call)
+    # Retrieve the exception so an unobserved failure is not logged
+    if not call.task.cancelled():
+        call.task.exception()